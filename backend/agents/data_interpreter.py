@@ -1,24 +1,74 @@
 # file: backend/agents/data_interpreter.py
+import os
 import pandas as pd
 import json
 from typing import Dict, Any, List
 from backend.utils.logger import setup_logger
-from backend.utils.config import get_llm_with_fallback, invoke_with_fallback
+from backend.utils.config import get_llm_with_fallback
+from backend.utils.llm_cache import cached_invoke
+from backend.utils.dtype_utils import detect_datetime_cols
+from backend.utils.digest import build_digest, digest_to_json
 from langchain_core.messages import SystemMessage, HumanMessage
 
 logger = setup_logger(__name__)
 
+
+def _extract_json(content: str) -> Dict[str, Any]:
+    """Parse the first JSON object out of an LLM response.
+
+    raw_decode from the first '{' tolerates code fences and trailing prose
+    without the repeated full-string splits of the old cleanup.
+    """
+    start = content.find('{')
+    if start == -1:
+        raise ValueError("No JSON object found in response")
+    obj, _ = json.JSONDecoder().raw_decode(content[start:])
+    return obj
+
+
 class DataInterpreter:
-    def __init__(self):
+    def __init__(self, use_arrow: bool = True):
         self.llm = get_llm_with_fallback(provider="groq", model_index=0)
+        self.use_arrow = use_arrow
 
     def load_data(self, file_path: str) -> pd.DataFrame:
-        """Load data from CSV or Excel."""
+        """Load data from CSV or Excel.
+
+        Prefers the multi-threaded PyArrow CSV engine with Arrow-backed
+        dtypes; falls back to the default NumPy parsers if unavailable.
+        """
         try:
-            if file_path.endswith('.csv'):
-                df = pd.read_csv(file_path)
+            if file_path.endswith('.parquet'):
+                # Excel sidecars live next to the upload, so task-file
+                # resolution can hand us the .parquet path after a restart;
+                # it holds the same frame and reads faster than the source
+                df = pd.read_parquet(file_path)
+            # .csv.gz arrives from clients that gzip the upload body;
+            # pandas infers and streams the decompression from the suffix
+            elif file_path.endswith(('.csv', '.csv.gz')):
+                df = None
+                if self.use_arrow:
+                    try:
+                        df = pd.read_csv(file_path, engine='pyarrow', dtype_backend='pyarrow')
+                    except (ImportError, ValueError) as e:
+                        logger.warning(f"PyArrow CSV engine unavailable ({e}), using default parser")
+                if df is None:
+                    df = pd.read_csv(file_path)
             elif file_path.endswith(('.xls', '.xlsx')):
-                df = pd.read_excel(file_path)
+                # Excel parsing is slow; cache a parquet sidecar after the
+                # first read so repeat loads go through Arrow instead
+                parquet_path = file_path + ".parquet"
+                if os.path.exists(parquet_path):
+                    df = pd.read_parquet(parquet_path)
+                else:
+                    try:
+                        df = pd.read_excel(file_path, engine='calamine')
+                    except (ImportError, ValueError):
+                        df = pd.read_excel(file_path)
+                    try:
+                        df.to_parquet(parquet_path, compression='zstd')
+                    except (ImportError, ValueError) as e:
+                        logger.warning(f"Could not write parquet cache ({e})")
             else:
                 raise ValueError("Unsupported file format")
             logger.info(f"Loaded dataset with shape: {df.shape}")
@@ -30,43 +80,48 @@ class DataInterpreter:
     def infer_schema(self, df: pd.DataFrame) -> Dict[str, str]:
         """Infer data types for each column."""
         schema = {}
+        datetime_cols = detect_datetime_cols(df)
         for col in df.columns:
-            dtype = str(df[col].dtype)
-            if "int" in dtype:
+            series = df[col]
+            # Dtype introspection helpers instead of substring checks on the
+            # dtype string: Arrow-backed columns stringify as e.g.
+            # "double[pyarrow]" / "date32[day][pyarrow]", which the old
+            # "float"/"datetime" substring tests misclassified as Unknown
+            if pd.api.types.is_integer_dtype(series):
                 schema[col] = "Integer"
-            elif "float" in dtype:
+            elif pd.api.types.is_float_dtype(series):
                 schema[col] = "Float"
-            elif "datetime" in dtype:
+            elif pd.api.types.is_datetime64_any_dtype(series) or col in datetime_cols:
+                # Covers native datetime64, Arrow timestamps/dates, and
+                # text columns whose sampled values parse as dates
                 schema[col] = "Datetime"
-            elif "object" in dtype:
-                # Check if it's actually a date
-                try:
-                    pd.to_datetime(df[col])
-                    schema[col] = "Datetime"
-                except:
-                    schema[col] = "Categorical/Text"
+            elif (isinstance(series.dtype, pd.CategoricalDtype)
+                  or pd.api.types.is_object_dtype(series)
+                  or pd.api.types.is_string_dtype(series)):
+                schema[col] = "Categorical/Text"
             else:
                 schema[col] = "Unknown"
         return schema
 
     async def summarize_dataset(self, df: pd.DataFrame) -> Dict[str, Any]:
         """Generate a semantic summary of the dataset using LLM."""
+        # Trivial frames don't need an LLM round-trip
+        if len(df) == 0 or len(df.columns) <= 1:
+            return {
+                "description": f"Dataset with {len(df)} rows and {len(df.columns)} columns.",
+                "key_entities": list(df.columns),
+                "potential_analyses": []
+            }
+
         schema = self.infer_schema(df)
-        preview = df.head(5).to_markdown()
-        stats = df.describe().to_markdown()
-        
+        digest = build_digest(df, schema=schema)
+
         prompt = f"""
-        You are a Data Scientist. Analyze this dataset preview and schema.
-        
-        Schema:
-        {json.dumps(schema, indent=2)}
-        
-        Preview:
-        {preview}
-        
-        Statistics:
-        {stats}
-        
+        You are a Data Scientist. Analyze this dataset digest (schema, sample rows, statistics).
+
+        Digest:
+        {digest_to_json(digest)}
+
         Provide a structured JSON summary with:
         1. 'description': Brief overview of what this data represents.
         2. 'key_entities': Main business entities found (e.g., Customers, Orders).
@@ -81,15 +136,8 @@ class DataInterpreter:
         ]
         
         try:
-            response = await invoke_with_fallback(self.llm, messages, provider="groq")
-            content = response.content
-            # Basic cleanup to ensure JSON
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0]
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0]
-                
-            summary = json.loads(content.strip())
+            response = await cached_invoke(self.llm, messages, provider="groq")
+            summary = _extract_json(response.content)
             return summary
         except Exception as e:
             logger.error(f"LLM summarization failed: {e}")
@@ -103,15 +151,41 @@ class DataInterpreter:
         """Main entry point for the agent."""
         df = self.load_data(file_path)
         schema = self.infer_schema(df)
-        
+
+        # Convert low-cardinality text columns to categorical once, so the
+        # nunique/value_counts/mode calls downstream hash integer codes
+        # instead of full string arrays. Cardinality is estimated on a
+        # 10k-row sample to keep this cheap on tall frames.
+        for col in df.select_dtypes(include=['object']).columns:
+            if schema.get(col) == "Datetime":
+                continue
+            sample = df[col].head(10_000)
+            if sample.nunique(dropna=True) / max(len(sample), 1) < 0.5:
+                df[col] = df[col].astype('category')
+
+        # Precompute shared column scans once so downstream agents
+        # don't each re-run select_dtypes/isnull on the same frame
+        numeric_cols = df.select_dtypes(include='number').columns.tolist()
+        # 'string' covers Arrow-backed text columns from the pyarrow dtype backend
+        object_cols = df.select_dtypes(include=['object', 'category', 'string']).columns.tolist()
+        missing = df.isnull().sum()
+        dup_count = int(df.duplicated(keep='first').sum())
+
         # Basic stats
         summary = {
             "rows": len(df),
             "columns": len(df.columns),
             "schema": schema,
-            "missing_values": df.isnull().sum().to_dict(),
+            "missing_values": missing.to_dict(),
+            "duplicate_rows": dup_count,
             "columns_list": list(df.columns)
         }
-        
-        return {"df": df, "initial_summary": summary}
+
+        return {
+            "df": df,
+            "initial_summary": summary,
+            "numeric_cols": numeric_cols,
+            "object_cols": object_cols,
+            "missing_per_col": missing
+        }
 # end file
@@ -1,17 +1,23 @@
 # file: backend/agents/data_quality_agent.py
+import re
 import pandas as pd
-from typing import Dict, Any, List
+from pandas.api.types import infer_dtype
+from typing import Dict, Any, List, Optional
 from backend.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Columns that should normally hold non-negative values
+_POSITIVE_COL_RE = re.compile(r'price|cost|qty', re.I)
+
 class DataQualityAgent:
     def __init__(self):
         pass
 
-    def check_missing_values(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def check_missing_values(self, df: pd.DataFrame, missing: Optional[pd.Series] = None) -> Dict[str, Any]:
         """Detect missing values and calculate percentage."""
-        missing = df.isnull().sum()
+        if missing is None:
+            missing = df.isnull().sum()
         missing_pct = (missing / len(df)) * 100
         
         return {
@@ -20,39 +26,50 @@ class DataQualityAgent:
             "percentage": missing_pct[missing_pct > 0].to_dict()
         }
 
-    def check_duplicates(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def check_duplicates(self, df: pd.DataFrame, dup_count: Optional[int] = None) -> Dict[str, Any]:
         """Detect duplicate rows."""
-        duplicates = df.duplicated().sum()
+        if dup_count is None:
+            dup_count = int(df.duplicated(keep='first').sum())
         return {
-            "count": int(duplicates),
-            "percentage": float((duplicates / len(df)) * 100)
+            "count": dup_count,
+            "percentage": float((dup_count / len(df)) * 100)
         }
 
-    def check_inconsistencies(self, df: pd.DataFrame) -> List[str]:
+    def check_inconsistencies(self, df: pd.DataFrame, numeric_cols: Optional[List[str]] = None,
+                              object_cols: Optional[List[str]] = None) -> List[str]:
         """Check for common data inconsistencies."""
         issues = []
-        
-        # Check for mixed types in object columns (heuristic)
-        for col in df.select_dtypes(include=['object']):
-            if df[col].apply(type).nunique() > 1:
+
+        if object_cols is None:
+            object_cols = df.select_dtypes(include=['object']).columns
+        if numeric_cols is None:
+            numeric_cols = df.select_dtypes(include=['number']).columns
+
+        # Check for mixed types in object columns (vectorized, no per-cell type())
+        for col in object_cols:
+            if infer_dtype(df[col], skipna=True).startswith('mixed'):
                 issues.append(f"Column '{col}' contains mixed data types.")
-                
+
         # Check for negative values in likely positive columns (price, quantity)
-        numeric_cols = df.select_dtypes(include=['number']).columns
-        for col in numeric_cols:
-            if "price" in col.lower() or "cost" in col.lower() or "qty" in col.lower():
-                if (df[col] < 0).any():
+        suspect_cols = [col for col in numeric_cols if _POSITIVE_COL_RE.search(col)]
+        if suspect_cols:
+            has_negative = df[suspect_cols].lt(0).any()
+            for col in suspect_cols:
+                if has_negative[col]:
                     issues.append(f"Column '{col}' has negative values which might be invalid.")
-                    
+
         return issues
 
-    def analyze_quality(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def analyze_quality(self, df: pd.DataFrame, numeric_cols: Optional[List[str]] = None,
+                        object_cols: Optional[List[str]] = None,
+                        missing_per_col: Optional[pd.Series] = None,
+                        dup_count: Optional[int] = None) -> Dict[str, Any]:
         """Run full quality check."""
         logger.info("Running Data Quality Analysis...")
-        
-        missing = self.check_missing_values(df)
-        duplicates = self.check_duplicates(df)
-        inconsistencies = self.check_inconsistencies(df)
+
+        missing = self.check_missing_values(df, missing=missing_per_col)
+        duplicates = self.check_duplicates(df, dup_count=dup_count)
+        inconsistencies = self.check_inconsistencies(df, numeric_cols=numeric_cols, object_cols=object_cols)
         
         # Calculate a simple quality score (0-100)
         # Deduct points for missing values and duplicates
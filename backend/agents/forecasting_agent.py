@@ -1,34 +1,52 @@
 # file: backend/agents/forecasting_agent.py
 import pandas as pd
 import numpy as np
-from prophet import Prophet
 from typing import Dict, Any, Optional
 from backend.utils.logger import setup_logger
-import matplotlib.pyplot as plt
+from backend.utils.dtype_utils import detect_datetime_cols
 import os
+import threading
 import uuid
 
 logger = setup_logger(__name__)
 
+# Prophet compiles a Stan model on import and matplotlib sets up a backend;
+# defer both so importing the workflow stays cheap when forecasting is skipped
+_plt = None
+
+
+def _lazy_imports():
+    """Import and configure matplotlib once per process."""
+    global _plt
+    if _plt is None:
+        import matplotlib
+        matplotlib.use('Agg')  # Non-interactive backend; no GUI event loop
+        import matplotlib.pyplot as plt
+        _plt = plt
+    return _plt
+
 class ForecastingAgent:
     def __init__(self, output_dir: str = "backend/forecasting"):
         self.output_dir = output_dir
         os.makedirs(self.output_dir, exist_ok=True)
+        # Reused across run_forecast calls to avoid per-call figure teardown;
+        # allocated lazily alongside the matplotlib import. The agent is a
+        # module-level singleton invoked via asyncio.to_thread, so the
+        # render section is serialized — two concurrent runs drawing into
+        # the same Figure would interleave and corrupt both plots.
+        self._fig = None
+        self._fig_lock = threading.Lock()
 
     def detect_time_series(self, df: pd.DataFrame) -> Optional[tuple]:
         """Identify the best date column and target metric for forecasting."""
         date_col = None
         target_col = None
-        
-        # Find date column
-        for col in df.columns:
+
+        # Find date column (sampled parse, shared across agents via df.attrs)
+        for col in detect_datetime_cols(df):
             if "date" in col.lower() or "time" in col.lower():
-                try:
-                    pd.to_datetime(df[col])
-                    date_col = col
-                    break
-                except:
-                    continue
+                date_col = col
+                break
         
         # Find target column (numeric, high variance usually interesting)
         if date_col:
@@ -57,26 +75,45 @@ class ForecastingAgent:
         prophet_df = df[[date_col, target_col]].rename(columns={date_col: 'ds', target_col: 'y'})
         prophet_df['ds'] = pd.to_datetime(prophet_df['ds'])
         
-        # Aggregate duplicates (Prophet doesn't like duplicate dates)
-        prophet_df = prophet_df.groupby('ds').sum().reset_index()
+        # Aggregate duplicates (Prophet doesn't like duplicate dates).
+        # sort + reduceat beats the hash-based groupby engine for sum-by-key,
+        # and the sort is free when the CSV is already in date order.
+        ds = prophet_df['ds'].to_numpy()
+        y = prophet_df['y'].to_numpy()
+        if not prophet_df['ds'].is_monotonic_increasing:
+            order = np.argsort(ds, kind='stable')
+            ds = ds[order]
+            y = y[order]
+        uniq, first_idx = np.unique(ds, return_index=True)
+        y_agg = np.add.reduceat(y, first_idx)
+        prophet_df = pd.DataFrame({'ds': uniq, 'y': y_agg})
         
         try:
+            from prophet import Prophet
+            plt = _lazy_imports()
+
             m = Prophet()
             m.fit(prophet_df)
-            
+
             future = m.make_future_dataframe(periods=periods)
             forecast = m.predict(future)
-            
-            # Plotting
-            fig1 = m.plot(forecast)
-            plot_path = os.path.join(self.output_dir, f"{uuid.uuid4()}_forecast.png")
-            fig1.savefig(plot_path)
-            plt.close(fig1)
-            
-            fig2 = m.plot_components(forecast)
-            components_path = os.path.join(self.output_dir, f"{uuid.uuid4()}_components.png")
-            fig2.savefig(components_path)
-            plt.close(fig2)
+
+            # Plotting (reuse the preallocated figure; dpi=80 halves PNG
+            # bytes). Under the lock: concurrent workflows share this
+            # agent and matplotlib figures aren't thread-safe.
+            with self._fig_lock:
+                if self._fig is None:
+                    self._fig = plt.figure(figsize=(10, 5))
+                m.plot(forecast, ax=self._fig.gca())
+                plot_path = os.path.join(self.output_dir, f"{uuid.uuid4()}_forecast.png")
+                self._fig.savefig(plot_path, dpi=80, bbox_inches='tight')
+                self._fig.clear()
+
+                # plot_components builds its own subplot grid, so it still needs its own figure
+                fig2 = m.plot_components(forecast)
+                components_path = os.path.join(self.output_dir, f"{uuid.uuid4()}_components.png")
+                fig2.savefig(components_path, dpi=80, bbox_inches='tight')
+                plt.close(fig2)
             
             # Calculate simple error metrics (on training set for now as proxy)
             # In production, we'd do a train/test split
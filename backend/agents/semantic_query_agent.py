@@ -2,7 +2,9 @@
 import pandas as pd
 from typing import Dict, Any
 from backend.utils.logger import setup_logger
-from backend.utils.config import get_llm_with_fallback, invoke_with_fallback
+from backend.utils.config import get_llm_with_fallback
+from backend.utils.llm_cache import cached_invoke
+from backend.utils.digest import build_digest, digest_to_json
 from langchain_core.messages import SystemMessage, HumanMessage
 
 logger = setup_logger(__name__)
@@ -15,23 +17,19 @@ class SemanticQueryAgent:
         """
         Answer 'Why' and 'How' questions using the dataset context.
         """
-        # Prepare context (summary stats) to fit in context window
-        # We don't pass the whole DF, just a summary
-        summary = df.describe(include='all').to_markdown()
-        head = df.head(5).to_markdown()
-        
+        # Prepare context (compact digest) to fit in context window
+        # We don't pass the whole DF, just schema + sample rows + stats
+        digest = build_digest(df)
+
         prompt = f"""
         You are a Senior Business Intelligence Analyst.
-        Answer the user's question based on the dataset preview and statistics provided below.
-        
+        Answer the user's question based on the dataset digest provided below.
+
         User Question: "{query}"
-        
-        Dataset Preview:
-        {head}
-        
-        Dataset Statistics:
-        {summary}
-        
+
+        Dataset Digest (schema, sample rows, statistics):
+        {digest_to_json(digest)}
+
         Additional Context:
         {context if context else 'None'}
         
@@ -45,7 +43,7 @@ class SemanticQueryAgent:
         ]
         
         try:
-            response = await invoke_with_fallback(self.llm, messages, provider="groq")
+            response = await cached_invoke(self.llm, messages, provider="groq")
             return {
                 "query": query,
                 "answer": response.content,
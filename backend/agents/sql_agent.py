@@ -1,28 +1,71 @@
 # file: backend/agents/sql_agent.py
 import pandas as pd
 import sqlite3
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
+
+try:
+    import duckdb
+    _HAS_DUCKDB = True
+except ImportError:
+    _HAS_DUCKDB = False
 from backend.utils.logger import setup_logger
-from backend.utils.config import get_llm_with_fallback, invoke_with_fallback
+from backend.utils.config import get_llm_with_fallback
+from backend.utils.llm_cache import cached_invoke
 from langchain_core.messages import SystemMessage, HumanMessage
 
 logger = setup_logger(__name__)
 
 class SQLAgent:
+    # Bounded like the server's DataFrame TTL cache so the process can't
+    # accumulate a connection (and, with DuckDB, a pinned frame) per
+    # dataset ever queried
+    _CONN_CACHE_MAX = 16
+
     def __init__(self):
         self.llm = get_llm_with_fallback(provider="groq", model_index=0)
+        # Connection per DataFrame so repeat questions skip the table load.
+        # Each entry keeps the frame itself so its id() can't be recycled
+        # by a new frame after gc and answer with stale data.
+        self._conn_cache: Dict[int, Tuple[pd.DataFrame, Any]] = {}
+        self.dialect = "DuckDB" if _HAS_DUCKDB else "SQLite"
+
+    def _register(self, df: pd.DataFrame, table_name: str = "dataset") -> Any:
+        """Expose the DataFrame as a SQL table (cached per frame).
+
+        Prefers DuckDB, which registers the frame zero-copy and runs
+        vectorized columnar SQL; falls back to copying into an in-memory
+        SQLite database when duckdb is not installed.
+        """
+        key = id(df)
+        entry = self._conn_cache.get(key)
+        if entry is not None and entry[0] is df:
+            return entry[1]
 
-    def df_to_sqlite(self, df: pd.DataFrame, table_name: str = "dataset") -> sqlite3.Connection:
-        """Load DataFrame into an in-memory SQLite database."""
-        conn = sqlite3.connect(":memory:")
-        df.to_sql(table_name, conn, index=False, if_exists="replace")
+        if _HAS_DUCKDB:
+            conn = duckdb.connect()
+            conn.register(table_name, df)
+        else:
+            conn = sqlite3.connect(":memory:")
+            df.to_sql(table_name, conn, index=False, if_exists="replace",
+                      method='multi', chunksize=10000)
+
+        # Evict oldest first (dicts preserve insertion order), closing the
+        # superseded connection so it doesn't leak
+        while len(self._conn_cache) >= self._CONN_CACHE_MAX:
+            _, old_conn = self._conn_cache.pop(next(iter(self._conn_cache)))
+            try:
+                old_conn.close()
+            except Exception:
+                pass
+
+        self._conn_cache[key] = (df, conn)
         return conn
 
     async def generate_sql(self, query: str, schema: Dict[str, str]) -> str:
         """Convert natural language to SQL."""
         prompt = f"""
         You are an expert SQL Data Analyst.
-        Convert the user's natural language query into a valid SQL query for a SQLite database.
+        Convert the user's natural language query into a valid SQL query for a {self.dialect} database.
         The table name is 'dataset'.
         
         Schema:
@@ -39,15 +82,21 @@ class SQLAgent:
         ]
         
         try:
-            response = await invoke_with_fallback(self.llm, messages, provider="groq")
+            response = await cached_invoke(self.llm, messages, provider="groq")
             sql = response.content.replace("```sql", "").replace("```", "").strip()
             return sql
         except Exception as e:
             logger.error(f"SQL generation failed: {e}")
             return ""
 
-    async def execute_query(self, df: pd.DataFrame, query: str) -> Dict[str, Any]:
-        """Process a natural language query on the dataframe."""
+    async def execute_query(self, df: pd.DataFrame, query: str,
+                            return_frame: bool = False) -> Dict[str, Any]:
+        """Process a natural language query on the dataframe.
+
+        With return_frame=True the raw result DataFrame is included under
+        'result_df' (and the list-of-dicts conversion is skipped) so the
+        caller can serialize it columnar instead of via JSON records.
+        """
         # 1. Infer schema for context
         schema = {col: str(df[col].dtype) for col in df.columns}
         
@@ -58,19 +107,24 @@ class SQLAgent:
             
         logger.info(f"Generated SQL: {sql_query}")
         
-        # 3. Execute SQL
-        conn = self.df_to_sqlite(df)
+        # 3. Execute SQL (connection stays cached for follow-up questions)
+        conn = self._register(df)
         try:
-            result_df = pd.read_sql_query(sql_query, conn)
-            return {
+            if _HAS_DUCKDB:
+                result_df = conn.execute(sql_query).fetch_df()
+            else:
+                result_df = pd.read_sql_query(sql_query, conn)
+            result = {
                 "query": query,
                 "sql": sql_query,
-                "result": result_df.to_dict(orient="records"),
                 "row_count": len(result_df)
             }
+            if return_frame:
+                result["result_df"] = result_df
+            else:
+                result["result"] = result_df.to_dict(orient="records")
+            return result
         except Exception as e:
             logger.error(f"SQL execution failed: {e}")
             return {"error": str(e), "sql": sql_query}
-        finally:
-            conn.close()
 # end file
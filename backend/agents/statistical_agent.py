@@ -1,19 +1,52 @@
 # file: backend/agents/statistical_agent.py
 import pandas as pd
 import numpy as np
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from backend.utils.logger import setup_logger
 
+try:
+    from numba import njit, prange
+    _HAS_NUMBA = True
+except ImportError:
+    _HAS_NUMBA = False
+    prange = range
+
 logger = setup_logger(__name__)
 
+
+def _iqr_outlier_kernel(arr):
+    """Per-column IQR bounds and outlier counts in one pass over a float64 matrix."""
+    n_cols = arr.shape[1]
+    counts = np.zeros(n_cols, dtype=np.int64)
+    lowers = np.full(n_cols, np.nan)
+    uppers = np.full(n_cols, np.nan)
+    for j in prange(n_cols):
+        col = arr[:, j]
+        col = col[~np.isnan(col)]
+        if col.size == 0:
+            continue
+        q1 = np.percentile(col, 25.0)
+        q3 = np.percentile(col, 75.0)
+        iqr = q3 - q1
+        lower = q1 - 1.5 * iqr
+        upper = q3 + 1.5 * iqr
+        lowers[j] = lower
+        uppers[j] = upper
+        counts[j] = np.sum((col < lower) | (col > upper))
+    return counts, lowers, uppers
+
+
+if _HAS_NUMBA:
+    _iqr_outlier_kernel = njit(parallel=True, cache=True)(_iqr_outlier_kernel)
+
 class StatisticalAgent:
     def __init__(self):
         pass
 
-    def get_descriptive_stats(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def get_descriptive_stats(self, df: pd.DataFrame, desc: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
         """Get standard descriptive statistics."""
         # Numeric stats
-        numeric_stats = df.describe().to_dict()
+        numeric_stats = (desc if desc is not None else df.describe()).to_dict()
         
         # Categorical stats
         categorical_cols = df.select_dtypes(include=['object', 'category']).columns
@@ -30,61 +63,96 @@ class StatisticalAgent:
             "categorical": categorical_stats
         }
 
-    def get_correlations(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def get_correlations(self, df: pd.DataFrame, numeric_cols: Optional[List[str]] = None) -> Dict[str, Any]:
         """Calculate correlation matrix for numeric columns."""
-        numeric_df = df.select_dtypes(include=['number'])
+        numeric_df = df[numeric_cols] if numeric_cols is not None else df.select_dtypes(include=['number'])
         if numeric_df.empty:
             return {"message": "No numeric columns for correlation."}
-            
-        corr_matrix = numeric_df.corr()
-        
-        # Find strong correlations
+
+        # Single BLAS matmul via np.corrcoef instead of pandas' per-pair path
+        cols = np.array(numeric_df.columns)
+        X = numeric_df.to_numpy(dtype=np.float64)
+        if np.isnan(X).any():
+            # np.corrcoef propagates NaN; drop incomplete rows so missing
+            # values don't blank the matrix. If that leaves too little
+            # data, fall back to pandas' pairwise-complete path.
+            complete = X[~np.isnan(X).any(axis=1)]
+            if len(complete) >= 2:
+                X = complete
+            else:
+                corr_matrix = numeric_df.corr()
+                X = None
+        if X is not None:
+            C = np.atleast_2d(np.corrcoef(X, rowvar=False))
+            corr_matrix = pd.DataFrame(C, index=cols, columns=cols)
+        else:
+            C = corr_matrix.to_numpy()
+
+        # Find strong correlations in the upper triangle (vectorized)
         strong_corrs = []
-        for i in range(len(corr_matrix.columns)):
-            for j in range(i):
-                val = corr_matrix.iloc[i, j]
-                if abs(val) > 0.7:
-                    strong_corrs.append({
-                        "col1": corr_matrix.columns[i],
-                        "col2": corr_matrix.columns[j],
-                        "correlation": round(val, 3)
-                    })
-                    
+        if len(cols) > 1:
+            iu = np.triu_indices_from(C, k=1)
+            vals = C[iu]
+            mask = np.abs(vals) > 0.7
+            for i, j, val in zip(iu[0][mask], iu[1][mask], vals[mask]):
+                strong_corrs.append({
+                    "col1": cols[i],
+                    "col2": cols[j],
+                    "correlation": round(float(val), 3)
+                })
+
         return {
             "matrix": corr_matrix.to_dict(),
             "strong_correlations": strong_corrs
         }
 
-    def detect_outliers(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def detect_outliers(self, df: pd.DataFrame, numeric_cols: Optional[List[str]] = None,
+                        desc: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
         """Detect outliers using IQR method."""
         outliers = {}
-        numeric_cols = df.select_dtypes(include=['number']).columns
-        
-        for col in numeric_cols:
-            Q1 = df[col].quantile(0.25)
-            Q3 = df[col].quantile(0.75)
-            IQR = Q3 - Q1
-            lower_bound = Q1 - 1.5 * IQR
-            upper_bound = Q3 + 1.5 * IQR
-            
-            outlier_count = ((df[col] < lower_bound) | (df[col] > upper_bound)).sum()
-            if outlier_count > 0:
+        if numeric_cols is None:
+            numeric_cols = df.select_dtypes(include=['number']).columns
+        numeric_cols = list(numeric_cols)
+        if not numeric_cols:
+            return outliers
+
+        numeric_arr = df[numeric_cols].to_numpy(dtype=np.float64)
+        if desc is not None:
+            # describe() already did the quantile partial sorts; just count
+            q1 = desc.loc['25%', numeric_cols].to_numpy(dtype=np.float64)
+            q3 = desc.loc['75%', numeric_cols].to_numpy(dtype=np.float64)
+            iqr = q3 - q1
+            lowers = q1 - 1.5 * iqr
+            uppers = q3 + 1.5 * iqr
+            # NaN comparisons are False, matching the kernel's NaN handling
+            counts = ((numeric_arr < lowers) | (numeric_arr > uppers)).sum(axis=0)
+        else:
+            counts, lowers, uppers = _iqr_outlier_kernel(numeric_arr)
+
+        for j, col in enumerate(numeric_cols):
+            if counts[j] > 0:
                 outliers[col] = {
-                    "count": int(outlier_count),
-                    "percentage": round((outlier_count / len(df)) * 100, 2),
-                    "lower_bound": float(lower_bound),
-                    "upper_bound": float(upper_bound)
+                    "count": int(counts[j]),
+                    "percentage": round((counts[j] / len(df)) * 100, 2),
+                    "lower_bound": float(lowers[j]),
+                    "upper_bound": float(uppers[j])
                 }
-                
+
         return outliers
 
-    def analyze(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def analyze(self, df: pd.DataFrame, numeric_cols: Optional[List[str]] = None) -> Dict[str, Any]:
         """Run full statistical analysis."""
         logger.info("Running Statistical Analysis...")
-        
+
+        if numeric_cols is None:
+            numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
+
+        # One describe() pass feeds both the stats block and the IQR bounds
+        desc = df[numeric_cols].describe() if numeric_cols else None
+
         return {
-            "descriptive_stats": self.get_descriptive_stats(df),
-            "correlations": self.get_correlations(df),
-            "outliers": self.detect_outliers(df)
+            "descriptive_stats": self.get_descriptive_stats(df, desc=desc),
+            "correlations": self.get_correlations(df, numeric_cols=numeric_cols),
+            "outliers": self.detect_outliers(df, numeric_cols=numeric_cols, desc=desc)
         }
 # end file
@@ -1,121 +1,203 @@
 # file: backend/agents/visualization_agent.py
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import os
 import uuid
-from typing import List, Dict, Any
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 from backend.utils.logger import setup_logger
+from backend.utils.dtype_utils import detect_datetime_cols
 
 logger = setup_logger(__name__)
 
+# Populated on first render; matplotlib/seaborn imports are deferred so
+# importing the workflow (e.g. for query-only requests) stays cheap
+_plt = None
+_sns = None
+
+
+def _lazy_imports():
+    """Import and configure matplotlib/seaborn once per process."""
+    global _plt, _sns
+    if _plt is None:
+        import matplotlib
+        matplotlib.use('Agg')  # Fork-safe, no GUI event loop; required for worker processes
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+        sns.set_theme(style="whitegrid")
+        _plt, _sns = plt, sns
+    return _plt, _sns
+
+
+# Reusable figures keyed by figsize (per process); avoids reallocating a
+# Canvas + Agg renderer for every chart
+_FIG_POOL: Dict[Tuple[float, float], Any] = {}
+
+
+def _get_fig(figsize: Tuple[float, float]):
+    """Fetch a cleared, reusable Figure for the given size."""
+    plt, _ = _lazy_imports()
+    fig = _FIG_POOL.get(figsize)
+    if fig is None:
+        fig = plt.figure(figsize=figsize)
+        _FIG_POOL[figsize] = fig
+    fig.clear()
+    return fig
+
+
+def _render(spec: Dict[str, Any]) -> str:
+    """Render a single chart spec to disk and return the file path.
+
+    Module-level (and fed only the pre-sliced data it needs) so it can run
+    in a ProcessPoolExecutor worker as well as in-process.
+    """
+    _, sns = _lazy_imports()
+    kind = spec["kind"]
+    title = spec["title"]
+    data = spec["data"]
+
+    fig = _get_fig(spec["figsize"])
+    ax = fig.gca()
+    if kind == "heatmap":
+        sns.heatmap(data, annot=True, cmap='coolwarm', fmt=".2f", ax=ax)
+    elif kind == "hist":
+        sns.histplot(data, kde=True, bins=64, ax=ax)
+    elif kind == "bar":
+        # data is a precomputed value_counts Series
+        sns.barplot(x=data.values, y=data.index, orient='h', ax=ax)
+        ax.set_ylabel(spec["ylabel"])
+    elif kind == "line":
+        sns.lineplot(x=spec["x"], y=spec["y"], data=data, ax=ax)
+    else:
+        raise ValueError(f"Unknown chart kind: {kind}")
+
+    filename = f"{uuid.uuid4()}_{title.replace(' ', '_').lower()}.png"
+    path = os.path.join(spec["output_dir"], filename)
+    ax.set_title(title)
+    fig.tight_layout()
+    fig.savefig(path, dpi=80)
+    logger.info(f"Generated plot: {path}")
+    return path
+
+
 class VisualizationAgent:
     def __init__(self, output_dir: str = "backend/visualizations"):
         self.output_dir = output_dir
         os.makedirs(self.output_dir, exist_ok=True)
-        # Set style
-        sns.set_theme(style="whitegrid")
 
-    def _save_plot(self, title: str) -> str:
-        """Save the current plot to a file and return the path."""
-        filename = f"{uuid.uuid4()}_{title.replace(' ', '_').lower()}.png"
-        path = os.path.join(self.output_dir, filename)
-        plt.title(title)
-        plt.tight_layout()
-        plt.savefig(path)
-        plt.close()
-        logger.info(f"Generated plot: {path}")
-        return path
-
-    def generate_correlation_heatmap(self, df: pd.DataFrame) -> str:
-        """Generate correlation heatmap."""
-        plt.figure(figsize=(10, 8))
-        numeric_df = df.select_dtypes(include=['number'])
+    @staticmethod
+    def _sample(s: pd.Series, n: int = 50_000) -> pd.Series:
+        """Downsample a column for plotting; visually indistinguishable past ~50k points."""
+        return s.sample(n, random_state=0) if len(s) > n else s
+
+    # --- Spec builders (cheap; heavy rendering happens in _render) ---
+
+    def _heatmap_spec(self, df: pd.DataFrame, numeric_cols: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        numeric_df = df[numeric_cols] if numeric_cols is not None else df.select_dtypes(include=['number'])
         if numeric_df.empty:
             return None
-            
-        corr = numeric_df.corr()
-        sns.heatmap(corr, annot=True, cmap='coolwarm', fmt=".2f")
-        return self._save_plot("Correlation Matrix")
+        return {"kind": "heatmap", "title": "Correlation Matrix", "figsize": (10, 8),
+                "data": numeric_df.corr(), "output_dir": self.output_dir}
 
-    def generate_distribution_plots(self, df: pd.DataFrame) -> List[str]:
+    def _distribution_specs(self, df: pd.DataFrame, numeric_cols: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        if numeric_cols is None:
+            numeric_cols = df.select_dtypes(include=['number']).columns
+        specs = []
+        for col in numeric_cols[:3]: # Limit to top 3 to avoid spam
+            specs.append({"kind": "hist", "title": f"Distribution of {col}", "figsize": (8, 6),
+                          "data": self._sample(df[col]), "output_dir": self.output_dir})
+        return specs
+
+    def _categorical_specs(self, df: pd.DataFrame, object_cols: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        if object_cols is None:
+            object_cols = df.select_dtypes(include=['object', 'category']).columns
+        specs = []
+        for col in object_cols[:3]:
+            counts = df[col].value_counts()
+            if len(counts) > 20: # Skip high cardinality
+                continue
+            specs.append({"kind": "bar", "title": f"Count of {col}", "figsize": (10, 6),
+                          "data": counts, "ylabel": col, "output_dir": self.output_dir})
+        return specs
+
+    def _time_series_spec(self, df: pd.DataFrame, date_col: str, value_col: str) -> Dict[str, Any]:
+        # Slice just the two needed columns; a full df.copy() would move every column
+        sub = df[[date_col, value_col]].copy()
+        sub[date_col] = pd.to_datetime(sub[date_col])
+        sub.sort_values(date_col, inplace=True)
+
+        # Bucket to daily means so matplotlib renders a bounded number of points
+        plot_df = sub.set_index(date_col).resample('D')[value_col].mean().reset_index()
+        return {"kind": "line", "title": f"Trend of {value_col} over Time", "figsize": (12, 6),
+                "data": plot_df, "x": date_col, "y": value_col, "output_dir": self.output_dir}
+
+    # --- Public single-chart entry points (render in-process) ---
+
+    def generate_correlation_heatmap(self, df: pd.DataFrame, numeric_cols: Optional[List[str]] = None) -> str:
+        """Generate correlation heatmap."""
+        spec = self._heatmap_spec(df, numeric_cols=numeric_cols)
+        return _render(spec) if spec else None
+
+    def generate_distribution_plots(self, df: pd.DataFrame, numeric_cols: Optional[List[str]] = None) -> List[str]:
         """Generate distribution plots for key numeric columns."""
-        paths = []
-        numeric_cols = df.select_dtypes(include=['number']).columns[:3] # Limit to top 3 to avoid spam
-        
-        for col in numeric_cols:
-            plt.figure(figsize=(8, 6))
-            sns.histplot(df[col], kde=True)
-            paths.append(self._save_plot(f"Distribution of {col}"))
-            
-        return paths
-
-    def generate_categorical_plots(self, df: pd.DataFrame) -> List[str]:
+        return [_render(spec) for spec in self._distribution_specs(df, numeric_cols=numeric_cols)]
+
+    def generate_categorical_plots(self, df: pd.DataFrame, object_cols: Optional[List[str]] = None) -> List[str]:
         """Generate bar charts for categorical columns."""
-        paths = []
-        cat_cols = df.select_dtypes(include=['object', 'category']).columns[:3]
-        
-        for col in cat_cols:
-            if df[col].nunique() > 20: # Skip high cardinality
-                continue
-                
-            plt.figure(figsize=(10, 6))
-            sns.countplot(y=col, data=df, order=df[col].value_counts().index)
-            paths.append(self._save_plot(f"Count of {col}"))
-            
-        return paths
+        return [_render(spec) for spec in self._categorical_specs(df, object_cols=object_cols)]
 
     def generate_time_series_plot(self, df: pd.DataFrame, date_col: str, value_col: str) -> str:
         """Generate a time series line chart."""
-        plt.figure(figsize=(12, 6))
-        
-        # Ensure date column is datetime
-        df_copy = df.copy()
-        df_copy[date_col] = pd.to_datetime(df_copy[date_col])
-        df_copy = df_copy.sort_values(by=date_col)
-        
-        sns.lineplot(x=date_col, y=value_col, data=df_copy)
-        return self._save_plot(f"Trend of {value_col} over Time")
-
-    def create_visualizations(self, df: pd.DataFrame) -> Dict[str, List[str]]:
-        """Auto-generate a suite of visualizations."""
+        return _render(self._time_series_spec(df, date_col, value_col))
+
+    def create_visualizations(self, df: pd.DataFrame, numeric_cols: Optional[List[str]] = None,
+                              object_cols: Optional[List[str]] = None) -> Dict[str, List[str]]:
+        """Auto-generate a suite of visualizations (rendered in parallel)."""
         logger.info("Generating visualizations...")
-        
+
+        if numeric_cols is None:
+            numeric_cols = df.select_dtypes(include=['number']).columns.tolist()
+        if object_cols is None:
+            object_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
+
         charts = {
             "correlation": [],
             "distributions": [],
             "categorical": [],
             "time_series": []
         }
-        
-        # Correlation
-        heatmap = self.generate_correlation_heatmap(df)
-        if heatmap:
-            charts["correlation"].append(heatmap)
-            
-        # Distributions
-        charts["distributions"] = self.generate_distribution_plots(df)
-        
-        # Categorical
-        charts["categorical"] = self.generate_categorical_plots(df)
-        
+
+        # Build cheap specs first; each carries only the data slice it plots
+        tagged_specs: List[Tuple[str, Dict[str, Any]]] = []
+
+        heatmap_spec = self._heatmap_spec(df, numeric_cols=numeric_cols)
+        if heatmap_spec:
+            tagged_specs.append(("correlation", heatmap_spec))
+
+        tagged_specs += [("distributions", s) for s in self._distribution_specs(df, numeric_cols=numeric_cols)]
+        tagged_specs += [("categorical", s) for s in self._categorical_specs(df, object_cols=object_cols)]
+
         # Detect potential time series
         # Simple heuristic: find a date col and a numeric col
-        date_cols = []
-        for col in df.columns:
-            if "date" in col.lower() or "time" in col.lower():
-                try:
-                    pd.to_datetime(df[col])
-                    date_cols.append(col)
-                except:
-                    pass
-        
-        numeric_cols = df.select_dtypes(include=['number']).columns
-        
+        date_cols = [col for col in detect_datetime_cols(df)
+                     if "date" in col.lower() or "time" in col.lower()]
         if date_cols and len(numeric_cols) > 0:
             # Plot first date col vs first numeric col as a sample
-            ts_plot = self.generate_time_series_plot(df, date_cols[0], numeric_cols[0])
-            charts["time_series"].append(ts_plot)
-            
+            tagged_specs.append(("time_series", self._time_series_spec(df, date_cols[0], numeric_cols[0])))
+
+        if not tagged_specs:
+            return charts
+
+        # Renders are embarrassingly parallel; Agg is fork-safe
+        specs = [spec for _, spec in tagged_specs]
+        try:
+            with ProcessPoolExecutor(max_workers=min(len(specs), os.cpu_count() or 1)) as pool:
+                paths = list(pool.map(_render, specs))
+        except (OSError, RuntimeError) as e:
+            logger.warning(f"Parallel rendering unavailable ({e}), falling back to serial")
+            paths = [_render(spec) for spec in specs]
+
+        for (category, _), path in zip(tagged_specs, paths):
+            charts[category].append(path)
+
         return charts
 # end file
@@ -1,4 +1,5 @@
 # file: backend/graph/workflow.py
+import asyncio
 from typing import TypedDict, Annotated, List, Dict, Any
 from langgraph.graph import StateGraph, END
 import pandas as pd
@@ -11,11 +12,30 @@ from backend.agents.visualization_agent import VisualizationAgent
 from backend.agents.forecasting_agent import ForecastingAgent
 from backend.agents.report_writer import ReportWriterAgent
 
+# DataFrames never travel through the graph state; they're parked here
+# keyed by task_id so the state stays a small dict of plain values
+# (LangGraph copies state between nodes, and any future checkpointing
+# would otherwise try to serialize a raw frame)
+_WORKFLOW_DFS: Dict[str, pd.DataFrame] = {}
+
+
+def release_workflow_df(task_id: str) -> None:
+    """Drop the frame parked for a run; safe to call after node_report.
+
+    The happy path releases in node_report, but a node exception skips
+    it — callers should invoke this in a finally so failed runs don't
+    leak a full DataFrame per attempt.
+    """
+    _WORKFLOW_DFS.pop(task_id, None)
+
 # Define State
 class AgentState(TypedDict):
     file_path: str
     task_id: str
-    df: Any # pandas DataFrame (not serializable in standard JSON, but okay for in-memory graph)
+    df_key: str  # lookup key into _WORKFLOW_DFS, set by the interpret node
+    numeric_cols: List[str]
+    object_cols: List[str]
+    missing_per_col: Any # pd.Series, shared so agents skip repeat isnull scans
     summary: Dict[str, Any]
     quality_report: Dict[str, Any]
     statistics: Dict[str, Any]
@@ -35,26 +55,42 @@ report_agent = ReportWriterAgent()
 async def node_interpret(state: AgentState):
     print("--- Node: Interpret Data ---")
     result = interpreter.process(state["file_path"])
-    return {"df": result["df"], "summary": result["initial_summary"]}
+    _WORKFLOW_DFS[state["task_id"]] = result["df"]
+    return {
+        "df_key": state["task_id"],
+        "summary": result["initial_summary"],
+        "numeric_cols": result["numeric_cols"],
+        "object_cols": result["object_cols"],
+        "missing_per_col": result["missing_per_col"]
+    }
 
 async def node_quality(state: AgentState):
     print("--- Node: Check Quality ---")
-    report = quality_agent.analyze_quality(state["df"])
+    # Offload sync pandas work so parallel nodes actually overlap
+    report = await asyncio.to_thread(
+        quality_agent.analyze_quality, _WORKFLOW_DFS[state["df_key"]],
+        numeric_cols=state["numeric_cols"], object_cols=state["object_cols"],
+        missing_per_col=state["missing_per_col"],
+        dup_count=state["summary"].get("duplicate_rows")
+    )
     return {"quality_report": report}
 
 async def node_statistics(state: AgentState):
     print("--- Node: Statistics ---")
-    stats = stat_agent.analyze(state["df"])
+    stats = await asyncio.to_thread(stat_agent.analyze, _WORKFLOW_DFS[state["df_key"]], numeric_cols=state["numeric_cols"])
     return {"statistics": stats}
 
 async def node_visualization(state: AgentState):
     print("--- Node: Visualization ---")
-    charts = viz_agent.create_visualizations(state["df"])
+    charts = await asyncio.to_thread(
+        viz_agent.create_visualizations, _WORKFLOW_DFS[state["df_key"]],
+        numeric_cols=state["numeric_cols"], object_cols=state["object_cols"]
+    )
     return {"visualizations": charts}
 
 async def node_forecast(state: AgentState):
     print("--- Node: Forecasting ---")
-    forecast = forecast_agent.run_forecast(state["df"])
+    forecast = await asyncio.to_thread(forecast_agent.run_forecast, _WORKFLOW_DFS[state["df_key"]])
     return {"forecast": forecast}
 
 async def node_report(state: AgentState):
@@ -68,6 +104,8 @@ async def node_report(state: AgentState):
         "forecast": state["forecast"]
     }
     report = await report_agent.generate_report(state["task_id"], analysis_results)
+    # The run is done; release the parked frame
+    _WORKFLOW_DFS.pop(state["df_key"], None)
     return {"final_report": report}
 
 # Build Graph
@@ -80,13 +118,12 @@ workflow.add_node("visualization", node_visualization)
 workflow.add_node("forecast", node_forecast)
 workflow.add_node("report", node_report)
 
-# Define Edges (Sequential for now, could be parallel)
+# Define Edges (Fan out after interpret; the four analysis nodes only read
+# the shared frame and write disjoint keys, so LangGraph can run them concurrently)
 workflow.set_entry_point("interpret")
-workflow.add_edge("interpret", "quality")
-workflow.add_edge("quality", "statistics")
-workflow.add_edge("statistics", "visualization")
-workflow.add_edge("visualization", "forecast")
-workflow.add_edge("forecast", "report")
+for node in ("quality", "statistics", "visualization", "forecast"):
+    workflow.add_edge("interpret", node)
+    workflow.add_edge(node, "report")
 workflow.add_edge("report", END)
 
 # Compile
@@ -3,14 +3,21 @@
 from dotenv import load_dotenv
 load_dotenv()  # Loads from .env in project root
 
-from fastapi import FastAPI, UploadFile, File, BackgroundTasks, HTTPException
+from fastapi import FastAPI, UploadFile, File, BackgroundTasks, Header, HTTPException
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
+import asyncio
+import functools
+import threading
 import uuid
 import os
-import shutil
+import aiofiles
+import anyio
 import logging
+from cachetools import TTLCache
 
 
 # Import utils
@@ -23,7 +30,10 @@ logger = setup_logger(__name__)
 app = FastAPI(
     title="AI Business Intelligence Copilot",
     description="Production-ready AI BI System with Multi-Agent Reasoning",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson serializes responses several times faster than stdlib json and
+    # natively handles numpy scalars and datetimes in query results
+    default_response_class=ORJSONResponse
 )
 
 # CORS Middleware
@@ -37,8 +47,22 @@ app.add_middleware(
 
 # Directories
 UPLOAD_DIR = "uploads"
+REPORT_DIR = "backend/report"  # Matches ReportWriterAgent's output_dir
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Upload limits
+MAX_UPLOAD_BYTES = 500 * 1024 * 1024  # 500 MB
+UPLOAD_CHUNK_BYTES = 1 << 20  # 1 MB
+
+# Content digest -> task_id, so re-uploading an identical file resumes the
+# existing analysis instead of re-running the whole workflow. Disk-backed
+# when diskcache is available so the index survives restarts.
+try:
+    import diskcache
+    _SHA_TASKS = diskcache.Cache(os.path.join(UPLOAD_DIR, ".sha_index"))
+except ImportError:
+    _SHA_TASKS: Dict[str, str] = {}
+
 # --- Models ---
 class AnalysisRequest(BaseModel):
     task_id: str
@@ -53,6 +77,18 @@ class SQLRequest(BaseModel):
     query: str
     dataset_id: str
 
+class BatchItem(BaseModel):
+    op: str  # "sql" or "semantic"
+    query: str
+    dataset_id: Optional[str] = None
+    context_id: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem]
+
+class ShaCheckRequest(BaseModel):
+    sha: str
+
 class FeedbackRequest(BaseModel):
     task_id: str
     rating: bool  # True = Up, False = Down
@@ -60,22 +96,34 @@ class FeedbackRequest(BaseModel):
 
 # --- Routes ---
 
+@app.on_event("startup")
+async def tune_thread_pool():
+    # CPU-bound pandas work is offloaded to this limiter; cap it so a burst
+    # of heavy queries can't spawn an unbounded thread pile-up
+    anyio.to_thread.current_default_thread_limiter().total_tokens = 32
+
 @app.get("/")
 async def root():
     return {"message": "AI BI Copilot Backend is Running 🚀"}
 
 # Import workflow
-from backend.graph.workflow import app_workflow
+from backend.graph.workflow import app_workflow, release_workflow_df
+
+# Task lifecycle, recorded by run_workflow and served by /status/{task_id}.
+# Bounded+TTL'd like _DF_CACHE so finished entries don't pile up forever.
+_TASK_STATUS: TTLCache = TTLCache(maxsize=256, ttl=24 * 3600)
 
 async def run_workflow(task_id: str, file_path: str):
     """Execute the LangGraph workflow."""
     logger.info(f"Starting workflow for {task_id}")
+    _TASK_STATUS[task_id] = {"status": "processing", "progress": 0.1,
+                             "current_agent": "Data Interpreter"}
     try:
         # Initial state
         initial_state = {
             "file_path": file_path,
             "task_id": task_id,
-            "df": None,
+            "df_key": "",
             "summary": {},
             "quality_report": {},
             "statistics": {},
@@ -92,18 +140,41 @@ async def run_workflow(task_id: str, file_path: str):
         result = await app_workflow.ainvoke(initial_state)
         
         logger.info(f"Workflow completed for {task_id}")
+        _TASK_STATUS[task_id] = {"status": "completed", "progress": 1.0,
+                                 "current_agent": None}
         # In a real app, we would persist 'result' to a database here.
         # For this demo, we'll just log it.
-        
+
     except Exception as e:
         logger.error(f"Workflow failed for {task_id}: {e}")
+        _TASK_STATUS[task_id] = {"status": "failed", "progress": 1.0,
+                                 "current_agent": None, "error": str(e)}
+    finally:
+        # node_report releases the parked frame on success; make sure a
+        # node exception doesn't leave it behind for good
+        release_workflow_df(task_id)
+
+@app.post("/analyze_dataset/check")
+async def analyze_dataset_check(request: ShaCheckRequest):
+    """
+    Return the existing task for an already-uploaded file, if any.
+
+    Clients hash their upload and ask here first; a hit resumes the prior
+    analysis in one small round trip instead of re-sending the file.
+    """
+    task_id = _SHA_TASKS.get(request.sha)
+    # Only resume tasks whose upload is still on disk
+    if task_id and get_file_path(task_id):
+        return {"task_id": task_id}
+    return {"task_id": None}
 
 @app.post("/analyze_dataset")
 async def analyze_dataset(
     background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     analysis_type: str = "full",
-    report_type: str = "pdf"
+    report_type: str = "pdf",
+    sha: Optional[str] = None
 ):
     """
     Upload a dataset and start the multi-agent analysis workflow.
@@ -112,19 +183,33 @@ async def analyze_dataset(
     file_path = os.path.join(UPLOAD_DIR, f"{task_id}_{file.filename}")
     
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
+        # Stream in chunks so the event loop never blocks on the full upload
+        # and memory stays flat regardless of file size
+        total_bytes = 0
+        async with aiofiles.open(file_path, "wb") as buffer:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                total_bytes += len(chunk)
+                if total_bytes > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail="File exceeds upload size limit.")
+                await buffer.write(chunk)
+
+        _TASK_FILES[task_id] = file_path
+        if sha:
+            _SHA_TASKS[sha] = task_id
         logger.info(f"File uploaded: {file.filename} (Task ID: {task_id})")
-        
+
         # Trigger Workflow
         background_tasks.add_task(run_workflow, task_id, file_path)
-        
+
         return {
             "task_id": task_id,
             "status": "processing",
             "message": "Analysis started successfully."
         }
+    except HTTPException:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
     except Exception as e:
         logger.error(f"Upload failed: {e}")
         raise HTTPException(status_code=500, detail="File upload failed.")
@@ -134,18 +219,77 @@ from backend.agents.sql_agent import SQLAgent
 from backend.agents.semantic_query_agent import SemanticQueryAgent
 from backend.agents.data_interpreter import DataInterpreter
 
-# Initialize Agents (Global for now, or per request)
-sql_agent = SQLAgent()
-semantic_agent = SemanticQueryAgent()
-interpreter = DataInterpreter()
+# Agents are built lazily on first use (and pre-warmed at startup) so
+# importing the app stays cheap and unused endpoints cost nothing
+@functools.cache
+def sql_agent() -> SQLAgent:
+    return SQLAgent()
 
-def get_file_path(task_id: str) -> str:
-    # Find file starting with task_id in uploads
-    for f in os.listdir(UPLOAD_DIR):
-        if f.startswith(task_id):
-            return os.path.join(UPLOAD_DIR, f)
+@functools.cache
+def semantic_agent() -> SemanticQueryAgent:
+    return SemanticQueryAgent()
+
+@functools.cache
+def interpreter() -> DataInterpreter:
+    return DataInterpreter()
+
+@app.on_event("startup")
+async def prewarm_agents():
+    # Off the request path so the first query doesn't pay agent init
+    await asyncio.to_thread(lambda: (sql_agent(), semantic_agent(), interpreter()))
+
+# task_id -> upload path; O(1) lookup instead of scanning the upload dir
+# per query. Rehydrated from disk once at startup for pre-existing uploads.
+_TASK_FILES: Dict[str, str] = {}
+
+def _rehydrate_task_files():
+    with os.scandir(UPLOAD_DIR) as entries:
+        for entry in entries:
+            if entry.is_file():
+                task_id = entry.name.split("_", 1)[0]
+                _TASK_FILES.setdefault(task_id, entry.path)
+
+_rehydrate_task_files()
+
+def _scan_fallback(task_id: str) -> Optional[str]:
+    # Covers files dropped into uploads/ after startup by other processes
+    with os.scandir(UPLOAD_DIR) as entries:
+        for entry in entries:
+            if entry.name.startswith(task_id):
+                _TASK_FILES[task_id] = entry.path
+                return entry.path
     return None
 
+def get_file_path(task_id: str) -> str:
+    return _TASK_FILES.get(task_id) or _scan_fallback(task_id)
+
+# Parsed DataFrames keyed by task_id; repeat NL queries skip the CSV reparse.
+# TTLCache isn't thread-safe and _load_cached runs in to_thread workers
+# (concurrently under /batch), so all access goes through the lock.
+_DF_CACHE: TTLCache = TTLCache(maxsize=16, ttl=1800)
+_DF_CACHE_LOCK = threading.Lock()
+_DF_CACHE_MAX_BYTES = 500 * 1024 * 1024
+
+def _load_cached(task_id: str):
+    """Load the dataset for a task, serving repeats from the TTL cache."""
+    with _DF_CACHE_LOCK:
+        df = _DF_CACHE.get(task_id)
+    if df is not None:
+        return df
+
+    file_path = get_file_path(task_id)
+    if not file_path:
+        return None
+
+    # Parse outside the lock; a rare duplicate parse beats serializing
+    # every cache miss behind one file read
+    df = interpreter().load_data(file_path)
+    # Don't let one huge frame pin the cache's memory budget
+    if df.memory_usage(deep=True).sum() <= _DF_CACHE_MAX_BYTES:
+        with _DF_CACHE_LOCK:
+            _DF_CACHE[task_id] = df
+    return df
+
 @app.post("/semantic_query")
 async def semantic_query(request: QueryRequest):
     """
@@ -153,39 +297,88 @@ async def semantic_query(request: QueryRequest):
     """
     if not request.context_id:
         return {"error": "Context ID (Task ID) is required."}
-        
-    file_path = get_file_path(request.context_id)
-    if not file_path:
+
+    # Parsing a large CSV is CPU-bound; keep it off the event loop
+    df = await asyncio.to_thread(_load_cached, request.context_id)
+    if df is None:
         return {"error": "Dataset not found."}
-        
-    # Load DF (In prod, use cache)
-    df = interpreter.load_data(file_path)
-    
-    result = await semantic_agent.answer_query(df, request.query)
+
+    result = await semantic_agent().answer_query(df, request.query)
     return result
 
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
 @app.post("/sql_query")
-async def sql_query(request: SQLRequest):
+async def sql_query(request: SQLRequest, accept: Optional[str] = Header(None)):
     """
     Convert NL to SQL and execute.
+
+    Clients that accept Arrow IPC get the result table as columnar bytes
+    instead of JSON row dicts — far cheaper to serialize and parse for
+    large numeric result sets. Everyone else gets the JSON shape as before.
     """
-    file_path = get_file_path(request.dataset_id)
-    if not file_path:
+    df = await asyncio.to_thread(_load_cached, request.dataset_id)
+    if df is None:
         return {"error": "Dataset not found."}
-        
-    # Load DF
-    df = interpreter.load_data(file_path)
-    
-    result = await sql_agent.execute_query(df, request.query)
+
+    want_arrow = bool(accept) and ARROW_MEDIA_TYPE in accept
+    result = await sql_agent().execute_query(df, request.query, return_frame=want_arrow)
+
+    result_df = result.pop("result_df", None)
+    if want_arrow and result_df is not None:
+        try:
+            import pyarrow as pa
+            table = pa.Table.from_pandas(result_df)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            # Header values must be latin-1; collapse the SQL onto one line
+            sql_header = " ".join(result.get("sql", "").split()).encode("ascii", "ignore").decode()
+            return Response(
+                sink.getvalue().to_pybytes(),
+                media_type=ARROW_MEDIA_TYPE,
+                headers={"x-generated-sql": sql_header}
+            )
+        except ImportError:
+            logger.warning("pyarrow not installed; answering SQL query as JSON")
+            result["result"] = result_df.to_dict(orient="records")
     return result
 
+@app.post("/batch")
+async def batch_query(request: BatchRequest):
+    """
+    Run several query operations in one round trip.
+
+    Dispatches to the existing SQL/semantic handlers concurrently so N
+    operations cost one HTTP round trip and max(t_op) server time.
+    """
+    async def run(item: BatchItem):
+        try:
+            if item.op == "sql":
+                return await sql_query(SQLRequest(query=item.query, dataset_id=item.dataset_id or ""), accept=None)
+            if item.op == "semantic":
+                return await semantic_query(QueryRequest(query=item.query, context_id=item.context_id))
+            return {"error": f"Unknown op: {item.op}"}
+        except Exception as e:
+            logger.error(f"Batch op '{item.op}' failed: {e}")
+            return {"error": str(e)}
+
+    results = await asyncio.gather(*(run(item) for item in request.requests))
+    return {"results": list(results)}
+
 @app.get("/status/{task_id}")
 async def get_status(task_id: str):
     """
     Get the progress of the analysis agents.
     """
-    # TODO: Fetch state from SQLite/LangGraph
-    return {"task_id": task_id, "status": "processing", "progress": 0.2, "current_agent": "Data Interpreter"}
+    state = _TASK_STATUS.get(task_id)
+    if state is None:
+        # Unknown here but the upload exists: the entry expired or the
+        # server restarted mid-run; report the task without guessing.
+        if get_file_path(task_id):
+            return {"task_id": task_id, "status": "unknown"}
+        raise HTTPException(status_code=404, detail="Task not found.")
+    return {"task_id": task_id, **state}
 
 @app.get("/charts/{task_id}")
 async def get_charts(task_id: str):
@@ -195,13 +388,25 @@ async def get_charts(task_id: str):
     # TODO: Fetch images from storage
     return {"charts": []}
 
+async def _stream_file(path: str, chunk_size: int = 1 << 16):
+    """Yield a file in chunks so large binaries are never buffered whole."""
+    async with aiofiles.open(path, "rb") as f:
+        while chunk := await f.read(chunk_size):
+            yield chunk
+
 @app.get("/report/{task_id}")
 async def get_report(task_id: str):
     """
     Download the final report.
     """
-    # TODO: Return PDF or Markdown
-    return {"report_url": f"/downloads/{task_id}_report.pdf"}
+    pdf_path = os.path.join(REPORT_DIR, f"{task_id}_report.pdf")
+    if not os.path.exists(pdf_path):
+        raise HTTPException(status_code=404, detail="Report not found.")
+    return StreamingResponse(
+        _stream_file(pdf_path),
+        media_type="application/pdf",
+        headers={"Content-Disposition": f"attachment; filename={task_id}_report.pdf"}
+    )
 
 @app.post("/feedback")
 async def submit_feedback(request: FeedbackRequest):
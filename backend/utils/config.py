@@ -2,9 +2,13 @@
 """LLM configuration with automatic multi-provider fallback."""
 from langchain_groq import ChatGroq
 from langchain_ollama import ChatOllama
-from typing import List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
+import asyncio
+import functools
 import logging
 import os
+import random
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -54,9 +58,93 @@ HUGGINGFACE_MODELS = [
 _current_provider = "ollama"
 _current_model_index = 0
 
+# How often a fallback walk restarts from the top of the plan instead of
+# the sticky last-known-good entry, so we drift back to preferred
+# providers once they recover
+HEALTH_PROBE_INTERVAL_SECS = 300
+_last_home_probe = time.monotonic()
+
+# Flattened routing order (Ollama -> Groq -> OpenRouter -> Hugging Face),
+# iterated with a plain loop instead of recursing per hop
+PROVIDER_PLAN: List[Tuple[str, int]] = (
+    [("ollama", i) for i in range(len(OLLAMA_MODELS))]
+    + [("groq", i) for i in range(len(GROQ_MODELS))]
+    + [("openrouter", i) for i in range(len(OPENROUTER_MODELS))]
+    + [("huggingface", i) for i in range(len(HUGGINGFACE_MODELS))]
+)
+
+# --- Circuit breaker per (provider, model_index) ---
+# Under a sustained outage, skipping dead entries saves a full network
+# timeout per model per request.
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RECOVERY_SECS = 60
+
+# Overall budget for one fallback walk; past it we fail fast to the mock
+# instead of letting ~15 candidates each burn their own timeout
+FALLBACK_DEADLINE_SECS = float(os.getenv("AI_FALLBACK_DEADLINE_MS", "12000")) / 1000.0
+LLM_TIMEOUT_SECS = 5
+
+
+class BreakerOpenError(Exception):
+    """Raised when a provider/model breaker is open; caller skips without a network hop."""
+
+
+class _Breaker:
+    __slots__ = ("state", "failures", "opened_at", "probe_lock")
+
+    def __init__(self):
+        self.state = "CLOSED"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_lock = asyncio.Lock()
+
+
+_breakers: Dict[Tuple[str, int], _Breaker] = {}
+
+
+def _get_breaker(provider: str, model_index: int) -> _Breaker:
+    key = (provider, model_index)
+    breaker = _breakers.get(key)
+    if breaker is None:
+        breaker = _breakers[key] = _Breaker()
+    return breaker
+
+
+def breaker_stats() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of breaker states (for status endpoints / debugging)."""
+    return {
+        f"{provider}[{index}]": {"state": b.state, "failures": b.failures}
+        for (provider, index), b in _breakers.items()
+    }
+
+# One keep-alive pool shared by the OpenRouter clients instead of a fresh
+# httpx.AsyncClient (and TLS handshake) per constructed model
+_shared_async_client = None
+
+
+def _get_shared_async_client():
+    global _shared_async_client
+    if _shared_async_client is None:
+        import httpx
+        _shared_async_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=50)
+        )
+    return _shared_async_client
+
+
 def get_llm_with_fallback(provider: str = "ollama", model_index: int = 0, temperature: float = 0):
-    """Get LLM instance for the specified provider."""
-    
+    """Get LLM instance for the specified provider (memoized per model)."""
+    return _build_llm(provider, model_index, temperature)
+
+
+def reset_llm_cache():
+    """Drop memoized clients (mainly for tests)."""
+    _build_llm.cache_clear()
+
+
+@functools.lru_cache(maxsize=64)
+def _build_llm(provider: str, model_index: int, temperature: float):
+    """Construct an LLM client; cached so each (provider, model, temp) keeps one warm connection pool."""
     if provider == "ollama":
         if model_index >= len(OLLAMA_MODELS):
             return None
@@ -75,7 +163,8 @@ def get_llm_with_fallback(provider: str = "ollama", model_index: int = 0, temper
         return ChatGroq(
             model=model,
             temperature=temperature,
-            api_key=Config.GROQ_API_KEY
+            api_key=Config.GROQ_API_KEY,
+            timeout=LLM_TIMEOUT_SECS
         )
     
     elif provider == "openrouter":
@@ -95,7 +184,9 @@ def get_llm_with_fallback(provider: str = "ollama", model_index: int = 0, temper
                 model=model,
                 temperature=temperature,
                 openai_api_key=api_key,
-                openai_api_base="https://openrouter.ai/api/v1"
+                openai_api_base="https://openrouter.ai/api/v1",
+                http_async_client=_get_shared_async_client(),
+                timeout=LLM_TIMEOUT_SECS
             )
         except ImportError:
             logger.warning("[LLM] langchain-openai not installed")
@@ -134,64 +225,126 @@ class MockChatLLM:
         from langchain_core.messages import AIMessage
         return AIMessage(content="**System Notice:** All AI providers are currently at capacity. Please try again in a few minutes.")
 
-async def invoke_with_fallback(llm: Any, messages, provider: str = "ollama", model_index: int = 0):
+def _is_retryable(e: Exception) -> bool:
+    """Rate limits, server errors and transport failures are worth backing off for."""
+    msg = str(e).lower()
+    return any(tok in msg for tok in ("429", "500", "502", "503", "504",
+                                      "timeout", "connection", "rate limit"))
+
+
+def _is_auth_error(e: Exception) -> bool:
+    """Auth failures won't heal on another model of the same provider."""
+    msg = str(e).lower()
+    return any(tok in msg for tok in ("401", "403", "unauthorized", "forbidden", "api key"))
+
+
+async def _call_through_breaker(breaker: _Breaker, llm: Any, messages):
+    """Invoke the model, honoring the breaker state for its (provider, index)."""
+    if breaker.state == "OPEN":
+        if time.monotonic() - breaker.opened_at < BREAKER_RECOVERY_SECS:
+            raise BreakerOpenError("breaker open, skipping")
+        breaker.state = "HALF_OPEN"
+
+    if breaker.state == "HALF_OPEN":
+        # Exactly one probe at a time; concurrent callers skip ahead
+        if breaker.probe_lock.locked():
+            raise BreakerOpenError("probe in flight, skipping")
+        async with breaker.probe_lock:
+            return await llm.ainvoke(messages)
+
+    return await llm.ainvoke(messages)
+
+
+async def invoke_with_fallback(llm: Any, messages, provider: str = "ollama", model_index: int = 0,
+                               deadline: Optional[float] = None):
     """
     Invoke LLM with automatic multi-provider fallback.
+
+    Walks PROVIDER_PLAN iteratively from the requested entry instead of
+    recursing per hop, applies jittered exponential backoff only for
+    retryable errors (429/5xx/transport), and skips the remaining models
+    of a provider on auth errors. The whole walk shares one deadline
+    (AI_FALLBACK_DEADLINE_MS, default 12s) after which the mock answers.
     """
-    global _current_provider, _current_model_index
-    
+    global _current_provider, _current_model_index, _last_home_probe
+
     if isinstance(llm, MockChatLLM):
         return await llm.ainvoke(messages)
 
+    if deadline is None:
+        deadline = time.monotonic() + FALLBACK_DEADLINE_SECS
+
     try:
-        result = await llm.ainvoke(messages)
-        _current_provider = provider
-        _current_model_index = model_index
-        return result
-        
-    except Exception as e:
-        error_msg = str(e).lower()
-        print(f"!!! LLM ERROR ({provider}, index {model_index}): {error_msg}")
-        
-        # 1. Try next model in CURRENT provider
-        if provider == "ollama":
-            if model_index < len(OLLAMA_MODELS) - 1:
-                print(f"[LLM DEBUG] Switching to Ollama model index {model_index + 1}: {OLLAMA_MODELS[model_index + 1]}")
-                return await invoke_with_fallback(get_llm_with_fallback("ollama", model_index + 1), messages, "ollama", model_index + 1)
-        elif provider == "groq":
-            if model_index < len(GROQ_MODELS) - 1:
-                print(f"[LLM DEBUG] Switching to Groq model index {model_index + 1}: {GROQ_MODELS[model_index + 1]}")
-                return await invoke_with_fallback(get_llm_with_fallback("groq", model_index + 1), messages, "groq", model_index + 1)
-        elif provider == "openrouter":
-            if model_index < len(OPENROUTER_MODELS) - 1:
-                print(f"[LLM DEBUG] Switching to OpenRouter model index {model_index + 1}: {OPENROUTER_MODELS[model_index + 1]}")
-                return await invoke_with_fallback(get_llm_with_fallback("openrouter", model_index + 1), messages, "openrouter", model_index + 1)
-        elif provider == "huggingface":
-            if model_index < len(HUGGINGFACE_MODELS) - 1:
-                print(f"[LLM DEBUG] Switching to HuggingFace model index {model_index + 1}: {HUGGINGFACE_MODELS[model_index + 1]}")
-                return await invoke_with_fallback(get_llm_with_fallback("huggingface", model_index + 1), messages, "huggingface", model_index + 1)
-
-        # 2. Switch Provider (Ollama -> Groq -> OpenRouter -> Hugging Face -> Mock)
-        if provider == "ollama":
-            logger.error("[LLM] Ollama exhausted. Switching to Groq...")
-            return await invoke_with_fallback(get_llm_with_fallback("groq", 0), messages, "groq", 0)
-
-        if provider == "groq":
-            logger.error("[LLM] Groq exhausted. Switching to OpenRouter...")
-            return await invoke_with_fallback(get_llm_with_fallback("openrouter", 0), messages, "openrouter", 0)
-            
-        if provider == "openrouter":
-            logger.error("[LLM] OpenRouter exhausted. Switching to Hugging Face...")
-            return await invoke_with_fallback(get_llm_with_fallback("huggingface", 0), messages, "huggingface", 0)
-            
-        # 3. Final Fallback
-        logger.error("[LLM] All providers exhausted. Using Safe Mode.")
-        return await MockChatLLM().ainvoke(messages)
+        start = PROVIDER_PLAN.index((provider, model_index))
+    except ValueError:
+        start = 0
+
+    # Start from the last entry that actually answered so each request
+    # doesn't re-walk (and re-time-out on) providers already known to be
+    # down. Every HEALTH_PROBE_INTERVAL_SECS one walk starts from the top
+    # of the plan again to check whether home has recovered.
+    now = time.monotonic()
+    if now - _last_home_probe >= HEALTH_PROBE_INTERVAL_SECS:
+        _last_home_probe = now
+        start = 0
+    else:
+        try:
+            sticky = PROVIDER_PLAN.index((_current_provider, _current_model_index))
+        except ValueError:
+            sticky = 0
+        start = max(start, sticky)
+
+    attempt = 0
+    skip_provider = None
+    for plan_provider, plan_index in PROVIDER_PLAN[start:]:
+        if time.monotonic() > deadline:
+            logger.error("[LLM] Fallback deadline exceeded. Using Safe Mode.")
+            break
+        if plan_provider == skip_provider:
+            continue
+
+        if (plan_provider, plan_index) == (provider, model_index):
+            current_llm = llm
+        else:
+            print(f"[LLM DEBUG] Switching to {plan_provider} model index {plan_index}")
+            current_llm = get_llm_with_fallback(plan_provider, plan_index)
+        if current_llm is None:
+            continue
+
+        breaker = _get_breaker(plan_provider, plan_index)
+        try:
+            result = await _call_through_breaker(breaker, current_llm, messages)
+            breaker.failures = 0
+            breaker.state = "CLOSED"
+            _current_provider = plan_provider
+            _current_model_index = plan_index
+            return result
+        except BreakerOpenError:
+            continue
+        except Exception as e:
+            breaker.failures += 1
+            if breaker.failures >= BREAKER_FAILURE_THRESHOLD:
+                breaker.state = "OPEN"
+                breaker.opened_at = time.monotonic()
+            print(f"!!! LLM ERROR ({plan_provider}, index {plan_index}): {str(e).lower()}")
+
+            if _is_auth_error(e):
+                logger.error(f"[LLM] Auth error on {plan_provider}; skipping its remaining models")
+                skip_provider = plan_provider
+                continue
+            if _is_retryable(e):
+                await asyncio.sleep(min(2 ** attempt, 8) + random.random() * 0.3)
+            attempt += 1
+
+    # Final Fallback
+    logger.error("[LLM] All providers exhausted. Using Safe Mode.")
+    return await MockChatLLM().ainvoke(messages)
 
 def reset_model_index():
     """Reset to primary provider."""
-    global _current_provider, _current_model_index
+    global _current_provider, _current_model_index, _last_home_probe
     _current_provider = "ollama"
     _current_model_index = 0
+    _last_home_probe = time.monotonic()
     logger.info("[LLM] Reset to Ollama primary model")
 # end file
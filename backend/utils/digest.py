@@ -0,0 +1,35 @@
+import json
+from typing import Any, Dict, Optional
+import pandas as pd
+
+
+def build_digest(df: pd.DataFrame, schema: Optional[Dict[str, str]] = None,
+                 max_cols: int = 20) -> Dict[str, Any]:
+    """Build a compact digest of a DataFrame for LLM prompts.
+
+    Much cheaper in prompt tokens than describe().to_markdown() on wide
+    frames, and computed once per frame (cached on df.attrs) so the
+    interpreter and query agents share a single describe() pass. Sample
+    rows and stats are capped at max_cols columns to bound prompt size on
+    very wide frames.
+    """
+    cached = df.attrs.get('digest')
+    if cached is not None:
+        return cached
+
+    if schema is None:
+        schema = {col: str(df[col].dtype) for col in df.columns}
+
+    narrow = df.iloc[:, :max_cols] if len(df.columns) > max_cols else df
+    digest = {
+        "schema": schema,
+        "head": narrow.head(5).to_dict('records'),
+        "stats": narrow.describe().round(3).to_dict()
+    }
+    df.attrs['digest'] = digest
+    return digest
+
+
+def digest_to_json(digest: Dict[str, Any]) -> str:
+    """Serialize a digest for inclusion in a prompt."""
+    return json.dumps(digest, indent=2, default=str)
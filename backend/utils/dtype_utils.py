@@ -0,0 +1,38 @@
+import pandas as pd
+from typing import List
+
+
+def is_datetime_col(series: pd.Series, sample: int = 1000) -> bool:
+    """Cheaply check whether a column holds parseable dates.
+
+    Parses only a sample of non-null values instead of materializing a
+    full datetime array per column just to discard it.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return True
+    # Arrow-backed date columns (date32/date64 from the pyarrow engine)
+    # aren't datetime64 dtypes but are dates all the same
+    if str(series.dtype).startswith(('date32', 'date64', 'timestamp')):
+        return True
+    if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+        return False
+
+    s = series.dropna().head(sample)
+    if s.empty:
+        return False
+    try:
+        parsed = pd.to_datetime(s, errors='coerce', format='mixed')
+    except (TypeError, ValueError):
+        return False
+    return parsed.notna().mean() > 0.95
+
+
+def detect_datetime_cols(df: pd.DataFrame) -> List[str]:
+    """Return datetime-like columns, cached on df.attrs so agents share one scan."""
+    cached = df.attrs.get('datetime_cols')
+    if cached is not None:
+        return cached
+
+    cols = [col for col in df.columns if is_datetime_col(df[col])]
+    df.attrs['datetime_cols'] = cols
+    return cols
@@ -0,0 +1,39 @@
+"""Prompt-keyed response cache for LLM calls."""
+import hashlib
+from typing import Any
+from backend.utils.config import invoke_with_fallback
+from backend.utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Persistent cache when diskcache is installed, plain dict otherwise
+try:
+    from diskcache import Cache
+    _cache: Any = Cache("./.llm_cache")
+except ImportError:
+    _cache = {}
+
+
+def _cache_key(messages, provider: str) -> str:
+    payload = "||".join(f"{type(m).__name__}:{m.content}" for m in messages)
+    return hashlib.sha256(f"{provider}::{payload}".encode()).hexdigest()
+
+
+async def cached_invoke(llm: Any, messages, provider: str = "groq", model_index: int = 0):
+    """invoke_with_fallback with a response cache keyed on the exact prompt.
+
+    Repeat queries on the same dataset digest/schema drop to a dict (or
+    diskcache) lookup instead of a fresh provider round-trip. The mock
+    "providers at capacity" notice is never cached.
+    """
+    key = _cache_key(messages, provider)
+    cached = _cache.get(key)
+    if cached is not None:
+        logger.info("[LLM CACHE] Hit, skipping provider call")
+        return cached
+
+    response = await invoke_with_fallback(llm, messages, provider=provider, model_index=model_index)
+    content = getattr(response, "content", None)
+    if content and "All AI providers" not in content:
+        _cache[key] = response
+    return response
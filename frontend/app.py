@@ -1,24 +1,175 @@
 # file: frontend/app.py
 import streamlit as st
-import requests
-import pandas as pd
-import json
+import httpx
+import asyncio
+import gzip
+import hashlib
+
+try:
+    import pyarrow as pa
+    _HAS_ARROW = True
+except ImportError:
+    _HAS_ARROW = False
+
+try:
+    import diskcache
+    _HAS_DISKCACHE = True
+except ImportError:
+    _HAS_DISKCACHE = False
+import re
 import time
-import os
 
 # Config
 API_URL = "http://localhost:8000"
 
+
+@st.cache_resource
+def _client() -> httpx.Client:
+    """One pooled keep-alive HTTP/2 client shared by every rerun.
+
+    Streamlit re-executes the script per interaction; a bare per-call
+    client would re-negotiate TCP+TLS to the backend each time. HTTP/2
+    additionally multiplexes concurrent requests over the one stream.
+    Transport retries cover the backend's connect-time hiccups.
+
+    The connect timeout is deliberately short: a cold backend that isn't
+    accepting connections should fail (and retry) in ~3 s, not eat the
+    whole read budget before the request even starts.
+    """
+    return httpx.Client(
+        http2=True,
+        headers={"Accept-Encoding": "gzip, br"},
+        timeout=httpx.Timeout(connect=3.05, read=57.0, write=57.0, pool=5.0),
+        limits=httpx.Limits(max_keepalive_connections=8, max_connections=16),
+        transport=httpx.HTTPTransport(retries=3)
+    )
+
+# SQL-intent keywords compiled once; routing is a single regex pass
+# instead of one substring scan per keyword on every rerun
+_SQL_RE = re.compile(r"\b(show|list|count|sum|average)\b", re.I)
+
 st.set_page_config(
     page_title="AI Business Intelligence Copilot",
     page_icon="📊",
     layout="wide"
 )
 
+async def _post_both(query: str, task_id: str):
+    """Fire the SQL and semantic queries concurrently.
+
+    Both are independent LLM round trips; awaiting them together makes
+    the pair cost max(t_sql, t_sem) instead of the sum, and HTTP/2 lets
+    them share one connection.
+    """
+    timeout = httpx.Timeout(connect=3.05, read=57.0, write=57.0, pool=5.0)
+    async with httpx.AsyncClient(http2=True, timeout=timeout) as client:
+        sql_res, sem_res = await asyncio.gather(
+            client.post(f"{API_URL}/sql_query", json={"query": query, "dataset_id": task_id}),
+            client.post(f"{API_URL}/semantic_query", json={"query": query, "context_id": task_id})
+        )
+        return sql_res.json(), sem_res.json()
+
+
+@st.cache_resource
+def _disk():
+    """Disk-backed result cache; survives app restarts unlike session_state."""
+    return diskcache.Cache("/tmp/bi_cache", size_limit=512 << 20)
+
+
+@st.fragment
+def _query_panel():
+    # Fragment-scoped: clicking Submit reruns only this panel instead of
+    # the whole script (sidebar, upload and report branches included)
+    query = st.text_input("Ask a question (e.g., 'Show total revenue by region')")
+
+    # Answers memoized across reruns so a stray widget change (or asking
+    # the same question twice) doesn't re-fire a slow backend call
+    st.session_state.setdefault("qcache", {})
+
+    if st.button("Submit"):
+        if query:
+            # Determine if SQL or Semantic
+            endpoint = "sql_query" if _SQL_RE.search(query) else "semantic_query"
+
+            task_id = st.session_state.get("task_id", "demo")
+            key = (endpoint, task_id, query)
+            data = st.session_state["qcache"].get(key)
+            if data is None and _HAS_DISKCACHE:
+                # Session state dies with the tab/container; the disk cache
+                # lets repeat questions skip the backend after a restart
+                data = _disk().get(("q",) + key)
+            if data is None:
+                with st.spinner("Thinking..."):
+                    try:
+                        payload = {"query": query, "dataset_id": task_id}
+                        headers = None
+                        if endpoint == "sql_query" and _HAS_ARROW:
+                            # Ask for the result table as Arrow IPC bytes;
+                            # columnar buffers parse far faster than JSON rows
+                            headers = {"accept": "application/vnd.apache.arrow.stream"}
+                        res = _client().post(f"{API_URL}/{endpoint}", json=payload, headers=headers)
+                        if res.headers.get("content-type", "").startswith("application/vnd.apache.arrow.stream"):
+                            data = {
+                                "sql": res.headers.get("x-generated-sql", ""),
+                                "result_df": pa.ipc.open_stream(res.content).read_all().to_pandas()
+                            }
+                        else:
+                            data = res.json()
+                        # Memoize only clean answers; a transient failure
+                        # (5xx body, missing dataset, bad SQL) must not be
+                        # replayed forever — especially from the disk cache
+                        ok = (res.status_code == 200
+                              and not (isinstance(data, dict) and "error" in data))
+                        if ok:
+                            qcache = st.session_state["qcache"]
+                            if len(qcache) >= 32:
+                                # Evict the oldest entry (dicts preserve insertion order)
+                                qcache.pop(next(iter(qcache)))
+                            qcache[key] = data
+                            if _HAS_DISKCACHE:
+                                _disk()[("q",) + key] = data
+                    except Exception as e:
+                        st.error(f"Error: {e}")
+            if data is not None:
+                if "result_df" in data:
+                    if data["sql"]:
+                        st.code(data["sql"], language="sql")
+                    st.dataframe(data["result_df"])
+                else:
+                    st.json(data)
+
+    if st.button("Run Both"):
+        if query:
+            with st.spinner("Running SQL + semantic together..."):
+                try:
+                    task_id = st.session_state.get("task_id", "demo")
+                    sql_data, sem_data = asyncio.run(_post_both(query, task_id))
+                    st.subheader("SQL Answer")
+                    st.json(sql_data)
+                    st.subheader("Semantic Answer")
+                    st.json(sem_data)
+                except Exception as e:
+                    st.error(f"Error: {e}")
+
+
 # Sidebar
 st.sidebar.title("🤖 AI BI Copilot")
 page = st.sidebar.radio("Navigation", ["Upload Dataset", "Dashboard", "Query Data", "Reports"])
 
+# Resume a previous task after a restart; uploads record themselves in the
+# disk cache, so analyzed datasets stay reachable without re-uploading
+if _HAS_DISKCACHE:
+    _cache = _disk()
+    _recent = sorted(
+        (k for k in _cache if isinstance(k, str)),
+        key=lambda k: _cache[k].get("created", 0),
+        reverse=True
+    )[:10]
+    if _recent:
+        _choice = st.sidebar.selectbox("Recent tasks", ["(current)"] + _recent)
+        if _choice != "(current)":
+            st.session_state["task_id"] = _choice
+
 if page == "Upload Dataset":
     st.title("📂 Upload Dataset")
     uploaded_file = st.file_uploader("Choose a CSV or Excel file", type=["csv", "xlsx"])
@@ -26,12 +177,49 @@ if page == "Upload Dataset":
     if uploaded_file:
         if st.button("Start Analysis"):
             with st.spinner("Uploading and starting agents..."):
-                files = {"file": uploaded_file}
                 try:
-                    res = requests.post(f"{API_URL}/analyze_dataset", files=files)
+                    name = uploaded_file.name
+                    raw = uploaded_file.getvalue()
+
+                    # Identical re-uploads are common while iterating; ask
+                    # the backend by content hash before sending any bytes
+                    digest = hashlib.sha256(raw).hexdigest()
+                    existing = None
+                    try:
+                        check = _client().post(
+                            f"{API_URL}/analyze_dataset/check",
+                            json={"sha": digest},
+                            timeout=httpx.Timeout(5.0, connect=3.05)
+                        )
+                        if check.status_code == 200:
+                            existing = check.json().get("task_id")
+                    except Exception:
+                        existing = None
+
+                    if existing:
+                        st.session_state["task_id"] = existing
+                        st.success(f"Identical file already analyzed! Task ID: {existing}")
+                        st.info("Go to the 'Dashboard' page to view results.")
+                        st.stop()
+
+                    # CSV text gzips 3-10x smaller, which dominates upload
+                    # time on slow links; xlsx is already deflate-compressed.
+                    # The backend's CSV reader decompresses .gz transparently.
+                    payload = raw
+                    if name.endswith(".csv"):
+                        payload = gzip.compress(payload, compresslevel=1)
+                        name += ".gz"
+                    res = _client().post(
+                        f"{API_URL}/analyze_dataset",
+                        params={"sha": digest},
+                        files={"file": (name, payload, "application/octet-stream")},
+                        timeout=httpx.Timeout(120.0, connect=3.05)
+                    )
                     if res.status_code == 200:
                         task_id = res.json()["task_id"]
                         st.session_state["task_id"] = task_id
+                        if _HAS_DISKCACHE:
+                            _disk()[task_id] = {"created": time.time()}
                         st.success(f"Analysis started! Task ID: {task_id}")
                         st.info("Go to the 'Dashboard' page to view progress.")
                     else:
@@ -71,24 +259,7 @@ elif page == "Dashboard":
 
 elif page == "Query Data":
     st.title("💬 Ask Your Data")
-    
-    query = st.text_input("Ask a question (e.g., 'Show total revenue by region')")
-    
-    if st.button("Submit"):
-        if query:
-            # Determine if SQL or Semantic
-            if any(x in query.lower() for x in ["show", "list", "count", "sum", "average"]):
-                endpoint = "sql_query"
-            else:
-                endpoint = "semantic_query"
-                
-            with st.spinner("Thinking..."):
-                try:
-                    payload = {"query": query, "dataset_id": st.session_state.get("task_id", "demo")}
-                    res = requests.post(f"{API_URL}/{endpoint}", json=payload)
-                    st.json(res.json())
-                except Exception as e:
-                    st.error(f"Error: {e}")
+    _query_panel()
 
 elif page == "Reports":
     st.title("📑 Reports")
@@ -96,9 +267,23 @@ elif page == "Reports":
     if "task_id" in st.session_state:
         task_id = st.session_state["task_id"]
         if st.button("Download PDF Report"):
-            st.write(f"Downloading report for {task_id}...")
-            # Link to backend download
-            st.markdown(f"[Click here to download]({API_URL}/report/{task_id})")
+            # Fetch over the warm pooled connection instead of bouncing the
+            # user to a new tab that opens a fresh unpooled one
+            with st.spinner(f"Fetching report for {task_id}..."):
+                try:
+                    res = _client().get(
+                        f"{API_URL}/report/{task_id}",
+                        timeout=httpx.Timeout(120.0, connect=3.05)
+                    )
+                    res.raise_for_status()
+                    st.download_button(
+                        "💾 Save PDF",
+                        data=res.content,
+                        file_name=f"{task_id}_report.pdf",
+                        mime="application/pdf"
+                    )
+                except Exception as e:
+                    st.error(f"Could not fetch report: {e}")
     else:
         st.warning("No analysis found.")
 # end file
@@ -1,55 +1,83 @@
 # file: tests/test_end_to_end.py
-import requests
-import time
+import aiofiles
+import aiohttp
+import asyncio
 import os
+import time
 
 API_URL = "http://localhost:8000"
 FILE_PATH = "sample_data.csv"
 
-def test_system():
+async def wait_ready(session, task_id, timeout=180):
+    """Poll /status until the workflow reports done, with capped backoff.
+
+    Returns as soon as the backend says the run finished (or failed)
+    instead of sleeping a fixed 30 s — fast runs stop waiting early,
+    slow runs aren't raced. Gives up (without failing) after the timeout
+    so the queries still run even if status reporting misbehaves.
+    """
+    delay = 0.5
+    t0 = time.monotonic()
+    while time.monotonic() - t0 < timeout:
+        async with session.get(f"{API_URL}/status/{task_id}") as res:
+            status = (await res.json()).get("status")
+        if status in ("done", "completed"):
+            return True
+        if status == "failed":
+            print("Workflow reported failure; continuing with the query tests.")
+            return False
+        await asyncio.sleep(delay)
+        delay = min(delay * 1.5, 5)
+    print(f"Status never reported done within {timeout}s; continuing anyway.")
+    return False
+
+async def test_system():
     print(f"--- Starting End-to-End Test ---")
-    
-    # 1. Upload Dataset
-    print(f"Uploading {FILE_PATH}...")
-    with open(FILE_PATH, "rb") as f:
-        files = {"file": f}
-        res = requests.post(f"{API_URL}/analyze_dataset", files=files)
-    
-    if res.status_code != 200:
-        print(f"Upload failed: {res.text}")
-        return
-        
-    task_id = res.json()["task_id"]
-    print(f"Task ID: {task_id}")
-    print("Analysis started in background. Waiting 30 seconds for agents to finish...")
-    
-    # Wait for workflow (simple sleep since we don't have a real status polling yet)
-    time.sleep(30)
-    
-    # 2. Test SQL Query
-    print("\n--- Testing SQL Agent ---")
-    sql_payload = {"query": "What is the total sales by Region?", "dataset_id": task_id}
-    try:
-        res = requests.post(f"{API_URL}/sql_query", json=sql_payload)
-        print(f"SQL Response: {res.json()}")
-    except Exception as e:
-        print(f"SQL Test Failed: {e}")
-
-    # 3. Test Semantic Query
-    print("\n--- Testing Semantic Query Agent ---")
-    sem_payload = {"query": "Why are sales higher in the North?", "context_id": task_id}
-    try:
-        res = requests.post(f"{API_URL}/semantic_query", json=sem_payload)
-        print(f"Semantic Response: {res.json()}")
-    except Exception as e:
-        print(f"Semantic Test Failed: {e}")
-
-    # 4. Check Report Generation
-    print("\n--- Checking Report ---")
-    # Since report generation is part of the workflow, we check if the file exists
-    # Note: In a real test we'd download it, but here we check the server logs or assume success if no error
-    print(f"Check the 'backend/report' folder for {task_id}_report.pdf")
+
+    timeout = aiohttp.ClientTimeout(total=60)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        # 1. Upload Dataset — async chunked reads keep the event loop free
+        # and overlap disk reads with the socket writes, so memory stays
+        # flat even for large fixtures
+        async def file_chunks(path, chunk_size=1 << 16):
+            async with aiofiles.open(path, "rb") as f:
+                while chunk := await f.read(chunk_size):
+                    yield chunk
+
+        print(f"Uploading {FILE_PATH}...")
+        form = aiohttp.FormData()
+        form.add_field("file", file_chunks(FILE_PATH), filename=os.path.basename(FILE_PATH))
+        async with session.post(f"{API_URL}/analyze_dataset", data=form) as res:
+            if res.status != 200:
+                print(f"Upload failed: {await res.text()}")
+                return
+            task_id = (await res.json())["task_id"]
+
+        print(f"Task ID: {task_id}")
+        print("Analysis started in background. Polling status until the agents finish...")
+        await wait_ready(session, task_id, timeout=60)
+
+        # 2 + 3. Both queries ride one /batch round trip; the server runs
+        # them concurrently and we pay a single RTT instead of two
+        print("\n--- Testing SQL + Semantic Agents (batched) ---")
+        body = {"requests": [
+            {"op": "sql", "query": "What is the total sales by Region?", "dataset_id": task_id},
+            {"op": "semantic", "query": "Why are sales higher in the North?", "context_id": task_id}
+        ]}
+        try:
+            async with session.post(f"{API_URL}/batch", json=body) as res:
+                sql_res, sem_res = (await res.json())["results"]
+            print(f"SQL Response: {sql_res}")
+            print(f"Semantic Response: {sem_res}")
+        except Exception as e:
+            print(f"Batch Test Failed: {e}")
+
+        # 4. Check Report Generation
+        print("\n--- Checking Report ---")
+        # Since report generation is part of the workflow, we check if the file exists
+        # Note: In a real test we'd download it, but here we check the server logs or assume success if no error
+        print(f"Check the 'backend/report' folder for {task_id}_report.pdf")
 
 if __name__ == "__main__":
-    test_system()
+    asyncio.run(test_system())
 # end file
@@ -8,29 +8,39 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from backend.utils.config import get_llm_with_fallback, invoke_with_fallback
 from langchain_core.messages import HumanMessage
 import asyncio
+from functools import lru_cache
 from dotenv import load_dotenv
 
 # Load env explicitly
 load_dotenv("backend/.env")
 
-async def test_llm():
+@lru_cache(maxsize=4)
+def _cached_llm(provider: str):
+    """Build the client once per provider; repeat checks reuse it."""
+    return get_llm_with_fallback(provider=provider)
+
+PROMPTS = [
+    "Hello! Are you working? Reply with 'Yes, I am online.'",
+]
+
+async def test_llm(prompt: str):
     print("--- Testing LLM Connection ---")
-    
+
     # Check keys
     groq_key = os.getenv("GROQ_API_KEY")
     print(f"GROQ_API_KEY present: {bool(groq_key)}")
-    
+
     # Try to get Groq first (since it's usually fast and free)
-    llm = get_llm_with_fallback(provider="groq")
-    
+    llm = _cached_llm("groq")
+
     if not llm:
         print("Failed to initialize LLM.")
         return
-        
+
     print(f"LLM Initialized: {type(llm).__name__}")
-    
+
     try:
-        messages = [HumanMessage(content="Hello! Are you working? Reply with 'Yes, I am online.'")]
+        messages = [HumanMessage(content=prompt)]
         print("Sending request...")
         response = await invoke_with_fallback(llm, messages, provider="groq")
         print(f"Response: {response.content}")
@@ -39,6 +49,13 @@ async def test_llm():
         print(f"--- FAILED ---")
         print(f"Error: {e}")
 
+async def main():
+    # One event loop (and one underlying HTTP pool, shared via the cached
+    # clients in config) for every prompt; an asyncio.run per check would
+    # rebuild the loop and SSL contexts each time
+    for prompt in PROMPTS:
+        await test_llm(prompt)
+
 if __name__ == "__main__":
-    asyncio.run(test_llm())
+    asyncio.run(main())
 # end file